@@ -24,23 +24,26 @@ __author__ = "Damon Lynch"
 __copyright__ = "Copyright 2016-2024, Damon Lynch"
 
 import builtins
+import functools
 import gettext
+import glob
+import json
 import locale
+import logging
+import operator
 import os
-from pathlib import Path
+import pickle
+import stat
+import tempfile
+import threading
 
-from PyQt5.QtCore import QSettings, QStandardPaths
-
-
-def sample_translation() -> str:
-    """
-    :return: return the Spanish translation as a sample translation
-    """
+i18n_domain = "rapid-photo-downloader"
 
-    mo_file = f"{i18n_domain}.mo"
-    return os.path.join("es", "LC_MESSAGES", mo_file)
+# The Spanish translation, used as a sample translation
+SAMPLE_TRANSLATION = os.path.join("es", "LC_MESSAGES", f"{i18n_domain}.mo")
 
 
+@functools.cache
 def locale_directory() -> str | None:
     """
     Locate locale directory. Prioritizes whatever is newer, comparing the locale
@@ -48,36 +51,247 @@ def locale_directory() -> str | None:
 
     If running in a snap, use the snap locale directory.
 
+    The result is cached for the lifetime of the process. An on-disk cache would
+    save nothing: validating it requires the same stat calls used to compute it.
+
     :return: the locale directory with the most recent messages for Rapid Photo
     Downloader, if found, else None.
     """
 
-    snap_name = os.getenv("SNAP_NAME", "")
-    if snap_name.find("rapid-photo-downloader") >= 0:
-        snap_dir = os.getenv("SNAP", "")
-        return os.path.join(snap_dir, "/usr/lib/locale")
+    snap_name = os.environ.get("SNAP_NAME")
+    if snap_name and snap_name.startswith("rapid-photo-downloader"):
+        snap_dir = os.environ.get("SNAP", "")
+        # The path must be relative, else os.path.join() discards snap_dir
+        return os.path.join(snap_dir, "usr/lib/locale")
 
     locale_dir = os.getenv("RPD_I18N_DIR")
     if locale_dir is not None and os.path.isdir(locale_dir):
         return locale_dir
 
-    sample_lang_path = sample_translation()
-    locale_mtime = 0.0
-    locale_dir = None
+    from PyQt5.QtCore import QStandardPaths
 
     data_home = QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation)
-    assert Path(data_home).is_dir()
 
-    for path in (data_home, "/usr/share"):
-        locale_path = os.path.join(path, "locale")
-        sample_path = os.path.join(locale_path, sample_lang_path)
+    # To consider another location, add it here
+    candidates = (os.path.join(path, "locale") for path in (data_home, "/usr/share"))
+    found = (
+        (mtime, locale_path)
+        for locale_path in candidates
+        if (mtime := sample_translation_mtime(locale_path)) is not None
+    )
+    # On a tie, max() returns the first, so prefer the user's data directory
+    newest = max(found, key=operator.itemgetter(0), default=None)
+    return None if newest is None else newest[1]
+
+
+def sample_translation_mtime(locale_path: str) -> float | None:
+    """
+    Get the modification time of the sample translation in a locale directory,
+    using one stat call.
+
+    Readability is not checked: should the file be unreadable, installing the
+    translation fails, which is handled.
+
+    :param locale_path: locale directory to check
+    :return: the modification time, or None if the sample translation does not exist
+    """
+
+    try:
+        st = os.stat(os.path.join(locale_path, SAMPLE_TRANSLATION))
+    except OSError:
+        return None
+    return st.st_mtime if stat.S_ISREG(st.st_mode) else None
+
+
+class CachedTranslations(gettext.GNUTranslations):
+    """
+    GNU translation catalog that can be pickled, so that a parsed .mo file can be
+    reused by later processes without parsing it again.
+    """
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # The plural function is generated at runtime and cannot be pickled
+        del state["plural"]
+        state["_fallback"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        plural = self._info.get("plural-forms")
+        if plural:
+            self.plural = gettext.c2py(plural.split(";")[1].split("plural=")[1])
+        else:
+            self.plural = lambda n: int(n != 1)
+
+
+def cache_directory() -> str:
+    """
+    :return: the directory in which translation setup details are cached
+    """
+
+    from PyQt5.QtCore import QStandardPaths
+
+    # Must use GenericCacheLocation, never CacheLocation: CacheLocation depends on the
+    # application name, which is not yet set in non-GUI processes or before the
+    # QApplication exists, so processes would not share the cache
+    cache_home = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
+    return os.path.join(cache_home, "rapid-photo-downloader")
+
+
+def write_cache_file(cache_path: str, data: bytes) -> None:
+    """
+    Write a file to the cache directory. The file is written then renamed, so a
+    concurrently starting process never reads a partially written file.
+
+    Does not catch errors.
+
+    :param cache_path: full path of the file
+    :param data: contents of the file
+    """
+
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as cache:
+        cache.write(data)
+    os.replace(temp_path, cache_path)
+
+
+def load_catalog(mo_path: str) -> CachedTranslations:
+    """
+    Load a translation catalog, using the cached copy of the parsed catalog if the
+    .mo file has not been modified since it was cached.
+
+    :param mo_path: full path of the .mo file
+    :return: the parsed catalog
+    """
+
+    # The language code is the name of the directory containing LC_MESSAGES
+    mo_lang = mo_path.split(os.sep)[-3]
+    mtime = os.stat(mo_path).st_mtime_ns
+    cache_dir = cache_directory()
+    cache_path = os.path.join(cache_dir, f"trans-{mo_lang}-{mtime}.pkl")
+
+    # Reading the cache is best effort. Unpickling a corrupt file can raise almost
+    # any exception, so on any failure parse the .mo file instead.
+    try:
+        with open(cache_path, "rb") as cache:
+            cached = pickle.load(cache)
+    except Exception as e:
+        logging.debug("Not using cached translation catalog %s: %s", cache_path, e)
+    else:
         if (
-            os.path.isfile(sample_path)
-            and os.access(sample_path, os.R_OK)
-            and os.path.getmtime(sample_path) > locale_mtime
+            isinstance(cached, tuple)
+            and len(cached) == 2
+            and cached[0] == mo_path
+            and isinstance(cached[1], CachedTranslations)
         ):
-            locale_dir = locale_path
-    return locale_dir
+            return cached[1]
+        logging.debug("Not using unexpected cached translation catalog %s", cache_path)
+
+    with open(mo_path, "rb") as mo:
+        catalog = CachedTranslations(mo)
+
+    try:
+        # Remove catalogs cached for previous versions of the .mo file
+        for stale in glob.glob(os.path.join(cache_dir, f"trans-{mo_lang}-*.pkl")):
+            os.remove(stale)
+        write_cache_file(
+            cache_path, pickle.dumps((mo_path, catalog), pickle.HIGHEST_PROTOCOL)
+        )
+    except (OSError, pickle.PicklingError) as e:
+        logging.debug("Unable to cache translation catalog %s: %s", cache_path, e)
+
+    return catalog
+
+
+def load_translation(localedir: str, lang: str) -> CachedTranslations | None:
+    """
+    Equivalent of gettext.translation(), but using cached parsed catalogs, and
+    returning None instead of raising an exception when there is no translation.
+
+    :param localedir: locale directory containing the .mo files
+    :param lang: language to load
+    :return: the translation, with fallbacks for less specific variants of the
+     language, if they exist, or None if there is no translation for the language
+    """
+
+    mo_paths = gettext.find(i18n_domain, localedir, [lang], all=True)
+    if not mo_paths:
+        return None
+
+    translation = None
+    for mo_path in mo_paths:
+        catalog = load_catalog(mo_path)
+        if translation is None:
+            translation = catalog
+        else:
+            translation.add_fallback(catalog)
+    return translation
+
+
+def preferred_language() -> str:
+    """
+    Get the language the user specified in the program preferences.
+
+    Reading the program settings parses the entire settings file, so the value is
+    cached and reused until the settings file is next modified.
+
+    :return: the language code, or an empty string if none is specified
+    """
+
+    from PyQt5.QtCore import QSettings, QStandardPaths
+
+    config_home = QStandardPaths.writableLocation(QStandardPaths.GenericConfigLocation)
+    settings_path = os.path.join(
+        config_home, "Rapid Photo Downloader", "Rapid Photo Downloader.conf"
+    )
+    cache_path = os.path.join(cache_directory(), "language.json")
+
+    try:
+        settings_mtime = os.stat(settings_path).st_mtime_ns
+    except OSError:
+        settings_mtime = None
+    else:
+        try:
+            with open(cache_path) as cache:
+                cached = json.load(cache)
+        except (OSError, ValueError) as e:
+            logging.debug("Not using cached language setting %s: %s", cache_path, e)
+        else:
+            if (
+                isinstance(cached, dict)
+                and cached.get("settings_mtime") == settings_mtime
+                and isinstance(cached.get("language"), str)
+            ):
+                return cached["language"]
+
+    settings = QSettings("Rapid Photo Downloader", "Rapid Photo Downloader")
+    settings.beginGroup("Display")
+    lang = settings.value("language", "", str)
+    settings.endGroup()
+
+    if settings_mtime is not None:
+        cached = dict(settings_mtime=settings_mtime, language=lang)
+        try:
+            write_cache_file(cache_path, json.dumps(cached).encode())
+        except OSError as e:
+            logging.debug("Unable to cache language setting %s: %s", cache_path, e)
+
+    return lang
+
+
+def untranslated_language(lang: str | None) -> bool:
+    """
+    :param lang: language code, e.g. en_US.UTF-8, or None if it is unknown
+    :return: True if the language is English, the C or POSIX locale, or unknown,
+     in which case there is no translation to look for
+    """
+
+    if not lang:
+        return True
+    return lang.split("_", 1)[0].split(".", 1)[0].lower() in ("en", "c", "posix")
 
 
 def no_translation_performed(s: str) -> str:
@@ -91,37 +305,66 @@ def no_translation_performed(s: str) -> str:
 # Install translation support
 # Users and specify the translation they want in the program preferences
 # The default is to use the system default
+#
+# Installation is deferred until the first string is translated, so that importing
+# a module from this package does not by itself import Qt or parse translations.
 
 
-i18n_domain = "rapid-photo-downloader"
-localedir = locale_directory()
-
+# Set by _install_translations()
+localedir = None
 lang = None
-lang_installed = False
+_translations_initialized = False
+# Held while installing the translation, so that other threads translating a string
+# meanwhile wait for the real translation function
+_translations_lock = threading.Lock()
 
-if localedir is not None and os.path.isfile(
-    os.path.join(localedir, sample_translation())
-):
-    settings = QSettings("Rapid Photo Downloader", "Rapid Photo Downloader")
-    settings.beginGroup("Display")
-    lang = settings.value("language", "", str)
-    settings.endGroup()
 
-    if not lang:
-        lang, encoding = locale.getdefaultlocale()
+def _install_translations() -> None:
+    """
+    Install the translation for the language the user specified in the program
+    preferences, else the system default language. Only runs once.
+    """
 
-    try:
-        gnulang = gettext.translation(
-            i18n_domain, localedir=localedir, languages=[lang]
-        )
-        gnulang.install()
-        lang_installed = True
-    except FileNotFoundError:
-        pass
-    except Exception:
-        pass
-
-if not lang_installed:
-    # Building on what lang.install() does above - but in this case, pretend we are
-    # translating files
-    builtins.__dict__["_"] = no_translation_performed
+    global localedir, lang, _translations_initialized
+
+    with _translations_lock:
+        if _translations_initialized:
+            return
+        try:
+            localedir = locale_directory()
+
+            if localedir is not None:
+                lang = preferred_language()
+                if not lang:
+                    lang, encoding = locale.getdefaultlocale()
+
+                if not untranslated_language(lang):
+                    try:
+                        gnulang = load_translation(localedir, lang)
+                    except (OSError, ValueError) as e:
+                        # The .mo file could not be read or is malformed
+                        logging.error("Unable to load translation for %s: %s", lang, e)
+                        gnulang = None
+                    if gnulang is not None:
+                        gnulang.install()
+        finally:
+            _translations_initialized = True
+            if builtins.__dict__["_"] is _lazy_translate:
+                # No translation was installed, or installing it failed. Building on
+                # what lang.install() does above - but in this case, pretend we are
+                # translating files. Never leave _lazy_translate() bound, else it
+                # would call itself.
+                builtins.__dict__["_"] = no_translation_performed
+
+
+def _lazy_translate(s: str) -> str:
+    """
+    Stand-in for _() until the first string is translated. Installs the real
+    translation function, which replaces this one, and then uses it.
+    """
+
+    _install_translations()
+    return builtins.__dict__["_"](s)
+
+
+builtins.__dict__["_"] = _lazy_translate
@@ -295,6 +295,7 @@ from raphodo.ui.toggleview import QToggleView
 from raphodo.ui.viewutils import (
     MainWindowSplitter,
     any_screen_scaled,
+    invalidate_dark_mode_on_palette_change,
     qt5_screen_scale_environment_variable,
     scaledIcon,
     standardMessageBox,
@@ -7516,6 +7517,7 @@ def main():
     app.setWindowIcon(QIcon(":/rapid-photo-downloader.svg"))
     if not args.force_system_theme:
         app.setStyle("Fusion")
+    invalidate_dark_mode_on_palette_change(app)
 
     # Determine the system locale as reported by Qt. Use it to
     # see if Qt has a base translation available, which allows
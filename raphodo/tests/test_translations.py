@@ -0,0 +1,449 @@
+# Copyright (C) 2024 Damon Lynch <damonlynch@gmail.com>
+
+# This file is part of Rapid Photo Downloader.
+#
+# Rapid Photo Downloader is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Rapid Photo Downloader is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Rapid Photo Downloader.  If not,
+# see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the translation setup in raphodo/__init__.py.
+
+Qt is only used to look up standard paths and read the program settings, so it is
+replaced with a stub.
+"""
+
+import builtins
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import raphodo
+
+# Polish has three plural forms, unlike the default of two
+polish_plural_forms = (
+    "nplurals=3; plural=(n==1 ? 0 : n%10>=2 && n%10<=4 && "
+    "(n%100<10 || n%100>=20) ? 1 : 2);"
+)
+
+
+def write_mo(
+    path: str,
+    messages: dict[str, str],
+    plural_forms: str = "nplurals=2; plural=(n != 1);",
+) -> None:
+    """
+    Write a GNU .mo file.
+
+    :param path: full path of the .mo file, whose directory is created if needed
+    :param messages: msgid: msgstr. Plural forms are separated by a null byte.
+    :param plural_forms: value of the Plural-Forms header, omitted if empty
+    """
+
+    header = "Content-Type: text/plain; charset=UTF-8\n"
+    if plural_forms:
+        header += f"Plural-Forms: {plural_forms}\n"
+    entries = sorted({"": header, **messages}.items())
+    ids = [msgid.encode() for msgid, msgstr in entries]
+    strs = [msgstr.encode() for msgid, msgstr in entries]
+
+    count = len(entries)
+    ids_table = 7 * 4
+    strs_table = ids_table + count * 8
+    data_start = strs_table + count * 8
+
+    table = []
+    data = b""
+    for string in ids + strs:
+        table.append((len(string), data_start + len(data)))
+        data += string + b"\0"
+
+    output = struct.pack("<7I", 0x950412DE, 0, count, ids_table, strs_table, 0, 0)
+    for length, offset in table:
+        output += struct.pack("<2I", length, offset)
+    output += data
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as mo:
+        mo.write(output)
+
+
+def mo_path(localedir: str, lang: str) -> str:
+    return os.path.join(localedir, lang, "LC_MESSAGES", f"{raphodo.i18n_domain}.mo")
+
+
+def qtcore_stub(
+    paths: dict[str, str], language: str = ""
+) -> tuple[dict[str, types.ModuleType], list]:
+    """
+    :param paths: standard location name, e.g. GenericDataLocation: path
+    :param language: language the stub QSettings returns
+    :return: modules to patch into sys.modules, and a list to which each QSettings
+     instance is appended when it is created
+    """
+
+    settings_created = []
+
+    class QStandardPaths:
+        GenericDataLocation = "GenericDataLocation"
+        GenericCacheLocation = "GenericCacheLocation"
+        GenericConfigLocation = "GenericConfigLocation"
+
+        @staticmethod
+        def writableLocation(location: str) -> str:
+            return paths[location]
+
+    class QSettings:
+        def __init__(self, *args) -> None:
+            settings_created.append(self)
+
+        def beginGroup(self, group: str) -> None:
+            pass
+
+        def endGroup(self) -> None:
+            pass
+
+        def value(self, key: str, default, value_type):
+            return language
+
+    qtcore = types.ModuleType("PyQt5.QtCore")
+    qtcore.QStandardPaths = QStandardPaths
+    qtcore.QSettings = QSettings
+    pyqt5 = types.ModuleType("PyQt5")
+    pyqt5.QtCore = qtcore
+    return {"PyQt5": pyqt5, "PyQt5.QtCore": qtcore}, settings_created
+
+
+class CachedTranslationsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.localedir = os.path.join(self.tempdir.name, "locale")
+        self.cache_dir = os.path.join(self.tempdir.name, "cache")
+        patcher = mock.patch.object(
+            raphodo, "cache_directory", return_value=self.cache_dir
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pickle_keeps_plural(self) -> None:
+        path = mo_path(self.localedir, "pl")
+        write_mo(path, {"file\0files": "plik\0pliki\0plików"}, polish_plural_forms)
+        with open(path, "rb") as mo:
+            catalog = raphodo.CachedTranslations(mo)
+
+        restored = pickle.loads(pickle.dumps(catalog))
+
+        for n, expected in ((1, "plik"), (3, "pliki"), (5, "plików"), (22, "pliki")):
+            self.assertEqual(restored.plural(n), catalog.plural(n))
+            self.assertEqual(restored.ngettext("file", "files", n), expected)
+
+    def test_pickle_default_plural(self) -> None:
+        path = mo_path(self.localedir, "de")
+        write_mo(path, {"file\0files": "Datei\0Dateien"}, plural_forms="")
+        with open(path, "rb") as mo:
+            catalog = raphodo.CachedTranslations(mo)
+
+        restored = pickle.loads(pickle.dumps(catalog))
+
+        self.assertEqual(restored.ngettext("file", "files", 1), "Datei")
+        self.assertEqual(restored.ngettext("file", "files", 2), "Dateien")
+
+    def test_cache_invalidated_when_mo_modified(self) -> None:
+        path = mo_path(self.localedir, "de")
+        write_mo(path, {"Hello": "Hallo"})
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        self.assertEqual(raphodo.load_catalog(path).gettext("Hello"), "Hallo")
+        self.assertEqual(os.listdir(self.cache_dir), ["trans-de-1000000000.pkl"])
+
+        # Same modification time: the cached catalog is used
+        write_mo(path, {"Hello": "Servus"})
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+        self.assertEqual(raphodo.load_catalog(path).gettext("Hello"), "Hallo")
+
+        # New modification time: the .mo file is parsed again
+        os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+        self.assertEqual(raphodo.load_catalog(path).gettext("Hello"), "Servus")
+        self.assertEqual(os.listdir(self.cache_dir), ["trans-de-2000000000.pkl"])
+
+    def test_corrupt_cache_ignored(self) -> None:
+        path = mo_path(self.localedir, "de")
+        write_mo(path, {"Hello": "Hallo"})
+        raphodo.load_catalog(path)
+        (cache_file,) = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, cache_file), "wb") as cache:
+            cache.write(b"not a pickle")
+
+        self.assertEqual(raphodo.load_catalog(path).gettext("Hello"), "Hallo")
+
+    def test_unexpected_cache_contents_ignored(self) -> None:
+        path = mo_path(self.localedir, "de")
+        write_mo(path, {"Hello": "Hallo"})
+        raphodo.load_catalog(path)
+        (cache_file,) = os.listdir(self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, cache_file)
+        other_mo_path = mo_path(self.localedir, "de_AT")
+
+        for contents in (
+            None,
+            [1],
+            (path,),
+            (path, "catalog"),
+            (other_mo_path, raphodo.load_catalog(path)),
+        ):
+            with self.subTest(contents=contents):
+                with open(cache_path, "wb") as cache:
+                    pickle.dump(contents, cache)
+                self.assertEqual(raphodo.load_catalog(path).gettext("Hello"), "Hallo")
+
+    def test_truncated_cache_ignored(self) -> None:
+        path = mo_path(self.localedir, "de")
+        write_mo(path, {"Hello": "Hallo"})
+        raphodo.load_catalog(path)
+        (cache_file,) = os.listdir(self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, cache_file)
+        with open(cache_path, "rb") as cache:
+            contents = cache.read()
+
+        for length in range(len(contents)):
+            with self.subTest(length=length):
+                with open(cache_path, "wb") as cache:
+                    cache.write(contents[:length])
+                self.assertEqual(raphodo.load_catalog(path).gettext("Hello"), "Hallo")
+
+    def test_fallback_to_less_specific_language(self) -> None:
+        write_mo(mo_path(self.localedir, "de"), {"Hello": "Hallo", "Yes": "Ja"})
+
+        translation = raphodo.load_translation(self.localedir, "de_AT")
+        self.assertEqual(translation.gettext("Hello"), "Hallo")
+
+        write_mo(mo_path(self.localedir, "de_AT"), {"Hello": "Servus"})
+
+        translation = raphodo.load_translation(self.localedir, "de_AT")
+        self.assertEqual(translation.gettext("Hello"), "Servus")
+        self.assertEqual(translation.gettext("Yes"), "Ja")
+
+    def test_no_translation(self) -> None:
+        write_mo(mo_path(self.localedir, "de"), {"Hello": "Hallo"})
+
+        self.assertIsNone(raphodo.load_translation(self.localedir, "fr_FR"))
+
+
+class PreferredLanguageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        config_home = os.path.join(self.tempdir.name, "config")
+        self.settings_path = os.path.join(
+            config_home, "Rapid Photo Downloader", "Rapid Photo Downloader.conf"
+        )
+        self.paths = dict(
+            GenericConfigLocation=config_home,
+            GenericCacheLocation=os.path.join(self.tempdir.name, "cache"),
+        )
+
+    def preferred_language(self, language: str) -> tuple[str, int]:
+        """
+        :return: the preferred language, and how many times QSettings was created
+        """
+
+        modules, settings_created = qtcore_stub(self.paths, language)
+        with mock.patch.dict(sys.modules, modules):
+            return raphodo.preferred_language(), len(settings_created)
+
+    def test_cached_until_settings_modified(self) -> None:
+        os.makedirs(os.path.dirname(self.settings_path))
+        with open(self.settings_path, "w") as settings:
+            settings.write("[Display]\nlanguage=de\n")
+        os.utime(self.settings_path, ns=(1_000_000_000, 1_000_000_000))
+
+        self.assertEqual(self.preferred_language("de"), ("de", 1))
+        # The settings would now return a different value, but the settings file
+        # is unchanged, so they are not read
+        self.assertEqual(self.preferred_language("fr"), ("de", 0))
+
+        os.utime(self.settings_path, ns=(2_000_000_000, 2_000_000_000))
+        self.assertEqual(self.preferred_language("fr"), ("fr", 1))
+        self.assertEqual(self.preferred_language("es"), ("fr", 0))
+
+    def test_unexpected_cache_contents_ignored(self) -> None:
+        os.makedirs(os.path.dirname(self.settings_path))
+        with open(self.settings_path, "w") as settings:
+            settings.write("[Display]\nlanguage=de\n")
+        settings_mtime = os.stat(self.settings_path).st_mtime_ns
+        cache_path = os.path.join(
+            self.paths["GenericCacheLocation"],
+            "rapid-photo-downloader",
+            "language.json",
+        )
+        self.assertEqual(self.preferred_language("de"), ("de", 1))
+
+        for contents in (
+            "[1]",
+            "null",
+            '"de"',
+            "{}",
+            "not json",
+            f'{{"settings_mtime": {settings_mtime}}}',
+            f'{{"settings_mtime": {settings_mtime}, "language": 1}}',
+        ):
+            with self.subTest(contents=contents):
+                with open(cache_path, "w") as cache:
+                    cache.write(contents)
+                self.assertEqual(self.preferred_language("fr"), ("fr", 1))
+
+    def test_no_settings_file(self) -> None:
+        self.assertEqual(self.preferred_language("de"), ("de", 1))
+        self.assertEqual(self.preferred_language("fr"), ("fr", 1))
+
+
+class InstallTranslationsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        saved = (
+            builtins.__dict__["_"],
+            raphodo._translations_initialized,
+            raphodo.localedir,
+            raphodo.lang,
+        )
+
+        def restore() -> None:
+            (
+                builtins.__dict__["_"],
+                raphodo._translations_initialized,
+                raphodo.localedir,
+                raphodo.lang,
+            ) = saved
+
+        self.addCleanup(restore)
+        builtins.__dict__["_"] = raphodo._lazy_translate
+        raphodo._translations_initialized = False
+
+    def test_failed_setup(self) -> None:
+        with mock.patch.object(
+            raphodo, "locale_directory", side_effect=ValueError("boom")
+        ):
+            with self.assertRaises(ValueError):
+                _("Photos")  # noqa: F821
+        self.assertIs(builtins.__dict__["_"], raphodo.no_translation_performed)
+        self.assertEqual(_("Photos"), "Photos")  # noqa: F821
+
+    def test_no_translation(self) -> None:
+        with mock.patch.object(raphodo, "locale_directory", return_value=None):
+            self.assertEqual(_("Photos"), "Photos")  # noqa: F821
+        self.assertTrue(raphodo._translations_initialized)
+        self.assertIs(builtins.__dict__["_"], raphodo.no_translation_performed)
+
+
+class UntranslatedLanguageTest(unittest.TestCase):
+    def test_untranslated(self) -> None:
+        for lang in (None, "", "en", "en_US.UTF-8", "en_GB", "C", "C.UTF-8", "POSIX"):
+            with self.subTest(lang=lang):
+                self.assertTrue(raphodo.untranslated_language(lang))
+
+    def test_translated(self) -> None:
+        for lang in ("de", "de_AT.UTF-8", "pt_BR", "ca", "cs_CZ"):
+            with self.subTest(lang=lang):
+                self.assertFalse(raphodo.untranslated_language(lang))
+
+
+class LocaleDirectoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.data_home = os.path.join(self.tempdir.name, "share")
+        self.user_locale = os.path.join(self.data_home, "locale")
+        self.system_locale = os.path.join("/usr/share", "locale")
+
+        environ = mock.patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+        for variable in ("SNAP_NAME", "RPD_I18N_DIR"):
+            os.environ.pop(variable, None)
+
+        raphodo.locale_directory.cache_clear()
+        self.addCleanup(raphodo.locale_directory.cache_clear)
+
+    def locale_directory(self, mtimes: dict[str, float | None]) -> str | None:
+        modules, settings_created = qtcore_stub(
+            dict(GenericDataLocation=self.data_home)
+        )
+        with (
+            mock.patch.dict(sys.modules, modules),
+            mock.patch.object(
+                raphodo, "sample_translation_mtime", side_effect=mtimes.get
+            ),
+        ):
+            return raphodo.locale_directory()
+
+    def test_newest_preferred(self) -> None:
+        self.assertEqual(
+            self.locale_directory({self.user_locale: 1.0, self.system_locale: 2.0}),
+            self.system_locale,
+        )
+        raphodo.locale_directory.cache_clear()
+        self.assertEqual(
+            self.locale_directory({self.user_locale: 2.0, self.system_locale: 1.0}),
+            self.user_locale,
+        )
+
+    def test_tie_prefers_user_data_directory(self) -> None:
+        self.assertEqual(
+            self.locale_directory({self.user_locale: 1.0, self.system_locale: 1.0}),
+            self.user_locale,
+        )
+
+    def test_only_one_candidate(self) -> None:
+        self.assertEqual(
+            self.locale_directory({self.system_locale: 1.0}), self.system_locale
+        )
+
+    def test_no_candidates(self) -> None:
+        self.assertIsNone(self.locale_directory({}))
+
+    def test_snap(self) -> None:
+        os.environ["SNAP_NAME"] = "rapid-photo-downloader"
+        os.environ["SNAP"] = "/snap/rapid-photo-downloader/123"
+        self.assertEqual(
+            self.locale_directory({}), "/snap/rapid-photo-downloader/123/usr/lib/locale"
+        )
+
+    def test_other_snap(self) -> None:
+        os.environ["SNAP_NAME"] = "other-program"
+        os.environ["SNAP"] = "/snap/other-program/123"
+        self.assertEqual(
+            self.locale_directory({self.system_locale: 1.0}), self.system_locale
+        )
+
+    def test_sample_translation_mtime(self) -> None:
+        self.assertIsNone(raphodo.sample_translation_mtime(self.user_locale))
+
+        sample = os.path.join(self.user_locale, raphodo.SAMPLE_TRANSLATION)
+        os.makedirs(sample)
+        # A directory is not a translation
+        self.assertIsNone(raphodo.sample_translation_mtime(self.user_locale))
+
+        os.rmdir(sample)
+        write_mo(sample, {})
+        self.assertEqual(
+            raphodo.sample_translation_mtime(self.user_locale),
+            os.stat(sample).st_mtime,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -27,15 +27,20 @@ similar to the GtkExpander', Copyright 2012 Canonical Ltd
 __author__ = "Damon Lynch"
 __copyright__ = "Copyright 2016-2024, Damon Lynch"
 
-from PyQt5.QtCore import QSize, pyqtSignal, pyqtSlot
+from typing import TYPE_CHECKING
+
+from PyQt5.QtCore import QSize, Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QColor
-from PyQt5.QtWidgets import QLayout, QWidget  # noqa: F401
+from PyQt5.QtWidgets import QWidget
 
 from raphodo.constants import DarkModeHeaderBackgroundName, HeaderBackgroundName
 from raphodo.ui.panelview import QPanelView
 from raphodo.ui.toggleswitch import QToggleSwitch
 from raphodo.ui.viewutils import BlankWidget, is_dark_mode
 
+if TYPE_CHECKING:
+    from PyQt5.QtWidgets import QLayout
+
 
 class QToggleView(QPanelView):
     """
@@ -72,13 +77,19 @@ class QToggleView(QPanelView):
 
         if display_alternate:
             self.alternateWidget = BlankWidget()
-            layout = self.layout()  # type: QLayout
+            layout: QLayout = self.layout()
             layout.addWidget(self.alternateWidget)
+            self._setAlternateVisible = self.alternateWidget.setVisible
         else:
             self.alternateWidget = None
+            self._setAlternateVisible = lambda visible: None
+
+        # The state last announced by valueChanged
+        self._lastOn = None  # type: bool|None
 
         self.toggleSwitch = QToggleSwitch(background=headerColor, parent=self)
-        self.toggleSwitch.valueChanged.connect(self.toggled)
+        # The switch is always in the same thread as this widget
+        self.toggleSwitch.valueChanged.connect(self.toggled, Qt.DirectConnection)
         if toggleToolTip:
             self.toggleSwitch.setToolTip(toggleToolTip)
         self.addHeaderWidget(self.toggleSwitch)
@@ -86,7 +97,9 @@ class QToggleView(QPanelView):
 
     def addWidget(self, widget: QWidget) -> None:
         super().addWidget(widget)
-        self.toggled(0)
+        # Always announce the state once the new widget is in place
+        self._lastOn = None
+        self.toggled(self.toggleSwitch.value())
 
     def on(self) -> bool:
         """Return if widget is expanded."""
@@ -100,27 +113,48 @@ class QToggleView(QPanelView):
 
     @pyqtSlot(int)
     def toggled(self, value: int) -> None:
+        """
+        Show or hide the content according to the toggle switch's state.
+
+        :param value: the toggle switch's slider value
+        """
+
+        # The switch's value changes repeatedly while it is being dragged, so only
+        # act on and announce the state when it really changes. setVisible() itself
+        # does nothing when a widget is already explicitly in the requested state.
+        on = value == self.toggleSwitch.sliderRange
+        changed = on != self._lastOn
         if self.content is not None:
-            self.content.setVisible(self.on())
-            if self.alternateWidget is not None:
-                self.alternateWidget.setVisible(not self.on())
+            # Always call setVisible(): a widget just added to a visible parent is
+            # hidden, but not explicitly so, and would be shown by the layout
+            self.content.setVisible(on)
+            # Hidden widgets are not painted. No content does periodic work while
+            # collapsed: collapsing the Devices or This Computer view removes its
+            # devices, which stops their spinners.
+            self._setAlternateVisible(not on)
+
+        if changed:
+            self._lastOn = on
+            self.valueChanged.emit(on)
+
+    def _minimumSize(self) -> QSize:
+        """
+        Calculate the minimum size, querying the base class only once.
+        """
 
-        self.valueChanged.emit(self.on())
+        size = super().minimumSize()
+        if not self.toggleSwitch.on():
+            return QSize(size.width(), self.header.height())
+        # critically important to call updateGeometry(), as minimum height is
+        # recalculated *after* sizeHint has been called by the Qt layout manager
+        self.updateGeometry()
+        return size
 
     def minimumSize(self) -> QSize:
-        size = super().minimumSize()
-        width = size.width()
-        height = self.minimumHeight()
-        return QSize(width, height)
+        return self._minimumSize()
 
     def minimumHeight(self) -> int:
-        if not self.toggleSwitch.on():
-            return self.header.height()
-        else:
-            # critically important to call updateGeometry(), as minimum height is
-            # recalculated *after* sizeHint has been called by the Qt layout manager
-            self.updateGeometry()
-            return super().minimumSize().height()
+        return self._minimumSize().height()
 
     def sizeHint(self) -> QSize:
-        return self.minimumSize()
+        return self._minimumSize()
@@ -615,6 +615,15 @@ def is_dark_mode() -> bool:
     return text_hsv_value > bg_hsv_value
 
 
+def invalidate_dark_mode_on_palette_change(app: QApplication) -> None:
+    """
+    Clear the cached result of is_dark_mode() whenever the application palette
+    changes, e.g. when the user switches the desktop theme.
+    """
+
+    app.paletteChanged.connect(lambda palette: is_dark_mode.cache_clear())
+
+
 class QNarrowListWidget(QListWidget):
     """
     Create a list widget that is not by default enormously wide.
@@ -48,7 +48,7 @@ from packaging.version import parse
 from PyQt5.QtCore import QLibraryInfo, QSize, QStandardPaths, QTranslator
 
 import raphodo.__about__ as __about__
-from raphodo import i18n_domain, localedir
+from raphodo import i18n_domain, locale_directory
 
 # TODO check which version of Arrow is used in distros these days
 # Arrow 0.9.0 separated the replace and shift functions into separate calls,
@@ -1125,6 +1125,7 @@ def available_lang_codes() -> list[str]:
     :return: list of language codes
     """
 
+    localedir = locale_directory()
     if localedir is not None:
         files = glob(os.path.join(localedir, "*", "LC_MESSAGES", "%s.mo" % i18n_domain))
         langs = [file.split(os.path.sep)[-3] for file in files]